@@ -0,0 +1,174 @@
+import atexit
+import json
+import queue
+import threading
+import time
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+# ----------------------------------------------------------------------------#
+# Structured access log.
+#
+# One compact JSON object per request is appended to ACCESS_LOG:
+#   {"ts": 1700000000.123, "method": "GET", "path": "/venues/1",
+#    "route": "/venues/<venue_id>", "params": {"venue_id": "1"}, "form": {},
+#    "status": 200, "ms": 12.4, "bytes": 5321, "queries": 3}
+# params holds view and query arguments, form the POSTed fields as lists of values,
+# bytes the body as sent (compressed or not; streamed bodies are counted as they go out).
+# Records are handed to a background thread so the request never waits on disk.
+# ----------------------------------------------------------------------------#
+
+class AccessLogWriter(threading.Thread):
+    def __init__(self, path, max_queue=10000, flush_interval=1.0):
+        super().__init__(name='access-log-writer', daemon=True)
+        self.path = path
+        # opened here rather than in run() so a bad ACCESS_LOG fails loudly in the caller
+        self.file = open(path, 'a', encoding='utf-8')
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.dropped = 0
+
+    def write(self, record):
+        # never block the request thread: drop the record if the writer is behind
+        try:
+            self.queue.put_nowait(json.dumps(record, separators=(',', ':'), default=str))
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        # a writer that already stopped would never drain the queue, and a full queue would block forever
+        if self.is_alive():
+            try:
+                self.queue.put(None, timeout=1)
+            except queue.Full:
+                pass
+            self.join(timeout=5)
+        if not self.is_alive():
+            self.file.close()
+
+    def run(self):
+        with self.file as f:
+            while True:
+                try:
+                    line = self.queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    f.flush()
+                    continue
+                if line is None:
+                    break
+                f.write(line + '\n')
+                # drain whatever else is already waiting before touching the disk again
+                while True:
+                    try:
+                        line = self.queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if line is None:
+                        f.flush()
+                        return
+                    f.write(line + '\n')
+            f.flush()
+
+
+class AccessLog(object):
+    def __init__(self, app=None):
+        self.writer = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('ACCESS_LOG', None)
+        app.config.setdefault('ACCESS_LOG_QUEUE_SIZE', 10000)
+        app.before_request(self._start_timer)
+        app.after_request(self._log_request)
+        event.listen(Engine, 'before_cursor_execute', _count_query)
+        # open the log now, an unwritable ACCESS_LOG should stop the app from starting
+        self._get_writer(app.config)
+
+    def _get_writer(self, config=None):
+        config = current_app.config if config is None else config
+        path = config['ACCESS_LOG']
+        if not path:
+            return None
+        if self.writer is None or self.writer.path != path:
+            with self._lock:
+                if self.writer is None or self.writer.path != path:
+                    if self.writer is not None:
+                        self.writer.close()
+                    writer = AccessLogWriter(path, max_queue=config['ACCESS_LOG_QUEUE_SIZE'])
+                    writer.start()
+                    atexit.register(writer.close)
+                    self.writer = writer
+        return self.writer
+
+    @staticmethod
+    def _start_timer():
+        g.access_log_ts = time.time()
+        g.access_log_start = time.perf_counter()
+        g.access_log_queries = 0
+
+    def _log_request(self, response):
+        writer = self._get_writer()
+        if writer is None or 'access_log_start' not in g:
+            return response
+        params = dict(request.view_args or {})
+        params.update(request.args.to_dict())
+        # keep every submitted value (genres is a multi-select) so the traffic can be replayed,
+        # but never the CSRF token
+        form = request.form.to_dict(flat=False)
+        form.pop('csrf_token', None)
+        record = {
+            'ts': round(g.access_log_ts, 3),
+            'method': request.method,
+            'path': request.full_path.rstrip('?'),
+            'route': request.url_rule.rule if request.url_rule else None,
+            'params': params,
+            'form': form,
+            'status': response.status_code,
+            'ms': round((time.perf_counter() - g.access_log_start) * 1000, 2),
+            'bytes': 0,
+            'queries': g.access_log_queries,
+        }
+        # bytes is the body as sent, after compression; this hook has to run after Compress's
+        if response.is_sequence:
+            record['bytes'] = response.calculate_content_length()
+            writer.write(record)
+        else:
+            # streamed bodies and files are counted as they go out and logged once the server closes them
+            response.response = CountingBody(response.iter_encoded(), getattr(response.response, 'close', None),
+                                             record, writer)
+            response.direct_passthrough = False
+        return response
+
+
+class CountingBody(object):
+    def __init__(self, chunks, close, record, writer):
+        self.chunks = chunks
+        self._close = close
+        self.record = record
+        self.writer = writer
+        self.closed = False
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            self.record['bytes'] += len(chunk)
+            yield chunk
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            if self._close is not None:
+                self._close()
+        finally:
+            self.writer.write(self.record)
+
+
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'access_log_queries' in g:
+        g.access_log_queries += 1
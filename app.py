@@ -3,20 +3,30 @@
 # ----------------------------------------------------------------------------#
 
 import datetime
+import hashlib
 import sys
+import time
+from datetime import timedelta
+from functools import wraps
 
+import click
 import dateutil.parser
 import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for, jsonify
+from flask import Flask, render_template, request, Response, flash, redirect, url_for, jsonify, make_response, \
+    session, abort
+from flask.cli import AppGroup
 from flask_moment import Moment
 from flask_sqlalchemy import SQLAlchemy
 import logging
 from logging import Formatter, FileHandler
 from flask_wtf import CSRFProtect
 from sqlalchemy import inspect
+from werkzeug.http import is_resource_modified
 
 from forms import *
 from flask_migrate import Migrate
+from accesslog import AccessLog
+from compression import Compress
 
 # ----------------------------------------------------------------------------#
 # App Config.
@@ -28,6 +38,10 @@ app.config.from_object('config')
 db = SQLAlchemy(app)
 migrate = Migrate(app, db)
 csrf = CSRFProtect(app)
+# after_request hooks run in reverse order of registration: Compress has to be set up after
+# AccessLog so the access log sees, and counts, the bytes actually sent
+access_log = AccessLog(app)
+compress = Compress(app)
 
 
 # ----------------------------------------------------------------------------#
@@ -50,6 +64,9 @@ class Venue(db.Model):
     website = db.Column(db.String(120))
     facebook_link = db.Column(db.String(120))
     shows = db.relationship('Show', backref='venue', lazy=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, server_default=db.func.now())
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow,
+                           server_default=db.func.now(), index=True)
 
 
 class Artist(db.Model):
@@ -67,14 +84,41 @@ class Artist(db.Model):
     website_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
     shows = db.relationship('Show', backref='artist', lazy=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, server_default=db.func.now())
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow,
+                           server_default=db.func.now(), index=True)
 
 
 class Show(db.Model):
     __tablename__ = 'Show'
+    __table_args__ = (
+        db.Index('ix_Show_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_Show_artist_id_start_time', 'artist_id', 'start_time'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id'), nullable=False)
     venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id'), nullable=False)
-    start_time = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    start_time = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, server_default=db.func.now())
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow,
+                           server_default=db.func.now(), index=True)
+
+
+class ShowArchive(db.Model):
+    # shows older than SHOW_ARCHIVE_HORIZON_DAYS, moved here by `flask fyyur archive`
+    # on Postgres the table is range partitioned by start_time, one partition per year
+    __tablename__ = 'ShowArchive'
+    __table_args__ = (
+        db.Index('ix_ShowArchive_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_ShowArchive_artist_id_start_time', 'artist_id', 'start_time'),
+        {'postgresql_partition_by': 'RANGE (start_time)'},
+    )
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    start_time = db.Column(db.DateTime, primary_key=True)
+    artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id'), nullable=False)
+    venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id'), nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False)
 
 
 # ----------------------------------------------------------------------------#
@@ -82,7 +126,7 @@ class Show(db.Model):
 # ----------------------------------------------------------------------------#
 
 def format_datetime(value, format='medium'):
-    date = dateutil.parser.parse(value)
+    date = value if isinstance(value, datetime) else dateutil.parser.parse(value)
     if format == 'full':
         format = "EEEE MMMM, d, y 'at' h:mma"
     elif format == 'medium':
@@ -93,6 +137,92 @@ def format_datetime(value, format='medium'):
 app.jinja_env.filters['datetime'] = format_datetime
 
 
+# ----------------------------------------------------------------------------#
+# Conditional GET.
+# ----------------------------------------------------------------------------#
+
+def entity_stamp(model, *criteria):
+    # newest change and row count, so deletes invalidate too
+    return [db.select(db.func.max(model.updated_at)).where(*criteria).scalar_subquery(),
+            db.select(db.func.count()).select_from(model).where(*criteria).scalar_subquery()]
+
+
+def show_boundary(now, *criteria):
+    # the next show to start and the last one that started: a page changes when a show moves from upcoming to past
+    return [db.select(db.func.min(Show.start_time)).where(Show.start_time > now, *criteria).scalar_subquery(),
+            db.select(db.func.max(Show.start_time)).where(Show.start_time <= now, *criteria).scalar_subquery()]
+
+
+def freshness(*columns):
+    # one round trip for every column of the validator
+    return tuple(db.session.query(*columns).one())
+
+
+def page_etag(state):
+    # pages embed a session bound CSRF token, so the token and its expiry window are part of the validator
+    time_limit = app.config.get('WTF_CSRF_TIME_LIMIT', 3600)
+    window = int(time.time() // time_limit) if time_limit else 0
+    return hashlib.sha1(repr((state, session.get('csrf_token'), window)).encode('utf-8')).hexdigest()
+
+
+def conditional(validator):
+    """Answer with 304 Not Modified before running the view when the validator still matches."""
+
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            # pending flash messages are rendered once, the page has to be built
+            if session.get('_flashes'):
+                return f(*args, **kwargs)
+            # no Last-Modified: deleting a row moves no timestamp, only the row counts in the ETag notice it
+            state = validator(**kwargs)
+            if not is_resource_modified(request.environ, etag=page_etag(state)):
+                response = Response(status=304)
+            else:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            # weak: the gzip, br and identity bodies of a page are equivalent, not byte for byte equal
+            response.set_etag(page_etag(state), weak=True)
+            response.cache_control.no_cache = True
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def venues_state():
+    now = datetime.utcnow()
+    return freshness(*entity_stamp(Venue), *entity_stamp(Show), *show_boundary(now))
+
+
+def artists_state():
+    return freshness(*entity_stamp(Artist))
+
+
+def shows_state():
+    return freshness(*entity_stamp(Venue), *entity_stamp(Artist), *entity_stamp(Show))
+
+
+def venue_state(venue_id):
+    now = datetime.utcnow()
+    artist_ids = db.select(Show.artist_id).where(Show.venue_id == venue_id)
+    return freshness(*entity_stamp(Venue, Venue.id == venue_id),
+                     *entity_stamp(Show, Show.venue_id == venue_id),
+                     *entity_stamp(Artist, Artist.id.in_(artist_ids)),
+                     *show_boundary(now, Show.venue_id == venue_id))
+
+
+def artist_state(artist_id):
+    now = datetime.utcnow()
+    venue_ids = db.select(Show.venue_id).where(Show.artist_id == artist_id)
+    return freshness(*entity_stamp(Artist, Artist.id == artist_id),
+                     *entity_stamp(Show, Show.artist_id == artist_id),
+                     *entity_stamp(Venue, Venue.id.in_(venue_ids)),
+                     *show_boundary(now, Show.artist_id == artist_id))
+
+
 # ----------------------------------------------------------------------------#
 # Controllers.
 # ----------------------------------------------------------------------------#
@@ -106,6 +236,7 @@ def index():
 #  ----------------------------------------------------------------
 
 @app.route('/venues')
+@conditional(venues_state)
 def venues():
     data = []
     cities = db.session.query(Venue.city,
@@ -138,6 +269,7 @@ def search_venues():
 
 
 @app.route('/venues/<int:venue_id>')
+@conditional(venue_state)
 def show_venue(venue_id):
     # shows the venue page with the given venue_id
     current_time = datetime.utcnow()
@@ -145,7 +277,8 @@ def show_venue(venue_id):
                                       Artist.image_link.label('artist_image_link'),
                                       Show.start_time).join(Show) \
         .filter(Show.start_time > current_time, Show.venue_id == venue_id).all()
-    past_shows = db.session.query(Artist.id, Artist.name, Artist.image_link,
+    past_shows = db.session.query(Artist.id.label('artist_id'), Artist.name.label('artist_name'),
+                                  Artist.image_link.label('artist_image_link'),
                                   Show.start_time).join(Show) \
         .filter(Show.start_time < current_time, Show.venue_id == venue_id).all()
 
@@ -155,10 +288,22 @@ def show_venue(venue_id):
     data['past_shows'] = past_shows
     data['num_upcoming_shows'] = len(data['upcoming_shows'])
     data['num_past_shows'] = len(data['past_shows'])
+    data['has_archived_shows'] = db.session.query(
+        ShowArchive.query.filter(ShowArchive.venue_id == venue_id).exists()).scalar()
 
     return render_template('pages/show_venue.html', venue=data)
 
 
+@app.route('/venues/<int:venue_id>/past_shows')
+def venue_archived_shows(venue_id):
+    # older past shows from the archive, newest first, for the "load more" button
+    query = db.session.query(Artist.id.label('artist_id'), Artist.name.label('artist_name'),
+                             Artist.image_link.label('artist_image_link'),
+                             ShowArchive.start_time, ShowArchive.id) \
+        .join(ShowArchive, ShowArchive.artist_id == Artist.id).filter(ShowArchive.venue_id == venue_id)
+    return jsonify(archived_shows_page(query, 'venue_archived_shows', venue_id=venue_id))
+
+
 #  Create Venue
 #  ----------------------------------------------------------------
 
@@ -212,6 +357,7 @@ def delete_venue(venue_id):
 #  Artists
 #  ----------------------------------------------------------------
 @app.route('/artists')
+@conditional(artists_state)
 def artists():
     data = db.session.query(Artist.id, Artist.name).all()
     return render_template('pages/artists.html', artists=data)
@@ -233,6 +379,7 @@ def search_artists():
 
 
 @app.route('/artists/<int:artist_id>')
+@conditional(artist_state)
 def show_artist(artist_id):
     # shows the venue page with the given venue_id
     current_time = datetime.utcnow()
@@ -240,7 +387,8 @@ def show_artist(artist_id):
                                       Venue.image_link.label('venue_image_link'),
                                       Show.start_time).join(Show) \
         .filter(Show.start_time > current_time, Show.artist_id == artist_id).all()
-    past_shows = db.session.query(Venue.id, Venue.name, Venue.image_link,
+    past_shows = db.session.query(Venue.id.label('venue_id'), Venue.name.label('venue_name'),
+                                  Venue.image_link.label('venue_image_link'),
                                   Show.start_time).join(Show) \
         .filter(Show.start_time < current_time, Show.artist_id == artist_id).all()
 
@@ -250,10 +398,22 @@ def show_artist(artist_id):
     data['past_shows'] = past_shows
     data['num_upcoming_shows'] = len(upcoming_shows)
     data['num_past_shows'] = len(past_shows)
+    data['has_archived_shows'] = db.session.query(
+        ShowArchive.query.filter(ShowArchive.artist_id == artist_id).exists()).scalar()
 
     return render_template('pages/show_artist.html', artist=data)
 
 
+@app.route('/artists/<int:artist_id>/past_shows')
+def artist_archived_shows(artist_id):
+    # older past shows from the archive, newest first, for the "load more" button
+    query = db.session.query(Venue.id.label('venue_id'), Venue.name.label('venue_name'),
+                             Venue.image_link.label('venue_image_link'),
+                             ShowArchive.start_time, ShowArchive.id) \
+        .join(ShowArchive, ShowArchive.venue_id == Venue.id).filter(ShowArchive.artist_id == artist_id)
+    return jsonify(archived_shows_page(query, 'artist_archived_shows', artist_id=artist_id))
+
+
 #  Update
 #  ----------------------------------------------------------------
 @app.route('/artists/<int:artist_id>/edit', methods=['GET'])
@@ -347,6 +507,7 @@ def create_artist_submission():
 #  ----------------------------------------------------------------
 
 @app.route('/shows')
+@conditional(shows_state)
 def shows():
     # displays list of shows at /shows
     # TODO: replace with real venues data.
@@ -357,7 +518,7 @@ def shows():
                             Artist.id.label('artist_id'),
                             Artist.name.label('artist_name'),
                             Artist.image_link.label('artist_image_link'),
-                            Show.start_time).join(Venue, Artist).all()
+                            Show.start_time).select_from(Show).join(Venue).join(Artist).all()
     return render_template('pages/shows.html', shows=data)
 
 
@@ -407,11 +568,86 @@ if not app.debug:
     app.logger.info('errors')
 
 
+def archived_shows_page(query, endpoint, **view_args):
+    # keyset pagination on (start_time, id) so every page is an index range scan, however deep
+    page_size = app.config['SHOW_ARCHIVE_PAGE_SIZE']
+    before = request.args.get('before')
+    if before:
+        try:
+            cursor = (datetime.fromisoformat(before), int(request.args.get('before_id', 0)))
+        except ValueError:
+            abort(400)
+        query = query.filter(db.tuple_(ShowArchive.start_time, ShowArchive.id) < cursor)
+    rows = query.order_by(ShowArchive.start_time.desc(), ShowArchive.id.desc()).limit(page_size + 1).all()
+    shows = []
+    for row in rows[:page_size]:
+        show = row._asdict()
+        show.pop('id')
+        show['start_time'] = format_datetime(row.start_time, 'full')
+        shows.append(show)
+    next_url = None
+    if len(rows) > page_size:
+        last = rows[page_size - 1]
+        next_url = url_for(endpoint, before=last.start_time.isoformat(), before_id=last.id, **view_args)
+    return {'shows': shows, 'next': next_url}
+
+
 def object_as_dict(obj):
     return {c.key: getattr(obj, c.key)
             for c in inspect(obj).mapper.column_attrs}
 
 
+# ----------------------------------------------------------------------------#
+# Commands.
+# ----------------------------------------------------------------------------#
+
+fyyur_cli = AppGroup('fyyur', help='Fyyur maintenance commands.')
+
+
+def ensure_archive_partitions(first, last):
+    # one range partition of ShowArchive per calendar year
+    for year in range(first.year, last.year + 1):
+        db.session.execute(db.text(
+            'CREATE TABLE IF NOT EXISTS "ShowArchive_{0}" PARTITION OF "ShowArchive" '
+            "FOR VALUES FROM ('{0}-01-01') TO ('{1}-01-01')".format(year, year + 1)))
+
+
+def archive_shows(cutoff, batch_size=1000):
+    """Move shows that started before cutoff from Show to ShowArchive, batch_size rows per transaction."""
+    columns = ['id', 'start_time', 'artist_id', 'venue_id', 'created_at', 'updated_at']
+    partitioned = db.engine.dialect.name == 'postgresql'
+    moved = 0
+    while True:
+        batch = db.session.query(Show.id, Show.start_time).filter(Show.start_time < cutoff) \
+            .order_by(Show.start_time).limit(batch_size).all()
+        if not batch:
+            return moved
+        ids = [show.id for show in batch]
+        if partitioned:
+            ensure_archive_partitions(batch[0].start_time, batch[-1].start_time)
+        db.session.execute(db.insert(ShowArchive).from_select(
+            columns, db.select(*[getattr(Show, c) for c in columns]).where(Show.id.in_(ids))))
+        Show.query.filter(Show.id.in_(ids)).delete(synchronize_session=False)
+        db.session.commit()
+        moved += len(ids)
+
+
+@fyyur_cli.command('archive')
+@click.option('--days', type=int, default=None,
+              help='Archive shows older than this many days (default: SHOW_ARCHIVE_HORIZON_DAYS).')
+@click.option('--batch-size', type=int, default=1000, help='Shows moved per transaction.')
+def archive_command(days, batch_size):
+    """Move past shows older than the horizon into the ShowArchive table."""
+    if days is None:
+        days = app.config['SHOW_ARCHIVE_HORIZON_DAYS']
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    moved = archive_shows(cutoff, batch_size)
+    click.echo('Archived {} shows that started before {}.'.format(moved, cutoff.isoformat(' ', 'seconds')))
+
+
+app.cli.add_command(fyyur_cli)
+
+
 # ----------------------------------------------------------------------------#
 # Launch.
 # ----------------------------------------------------------------------------#
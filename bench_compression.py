@@ -0,0 +1,112 @@
+"""Report bytes saved against CPU cost of response compression, per route.
+
+    python bench_compression.py
+    python bench_compression.py --repeat 50 --gzip-levels 1,6,9 --br-levels 4,11 /venues/1 /artists/1
+
+Every route is fetched once, uncompressed, through the Flask test client, then
+its body is compressed --repeat times with each encoding and level. CPU time is
+process time per response. "stream" rows compress the body in 8 KiB chunks
+with a flush after each one, which is what the middleware does for streamed
+responses; static files are compressed like "buffer" rows.
+"""
+import argparse
+import sys
+import time
+
+from compression import GzipCompressor, BrotliCompressor, available_encodings
+
+DEFAULT_ROUTES = [
+    ('GET', '/'),
+    ('GET', '/venues'),
+    ('GET', '/artists'),
+    ('GET', '/shows'),
+    ('POST', '/venues/search'),
+    ('POST', '/artists/search'),
+    ('GET', '/static/css/bootstrap.css'),
+    ('GET', '/static/js/libs/jquery-1.11.1.min.js'),
+]
+
+LEVELS = {'gzip': [1, 6, 9], 'br': [1, 4, 11]}
+LEVEL_RANGES = {'gzip': (1, 9), 'br': (0, 11)}
+CHUNK_SIZE = 8192
+
+
+def fetch(client, method, path):
+    data = {'search_term': ''} if method == 'POST' else None
+    response = client.open(path, method=method, data=data, headers={'Accept-Encoding': 'identity'})
+    body = response.get_data()
+    response.close()
+    return response.status_code, body
+
+
+def compress(encoding, level, body, stream):
+    compressor = GzipCompressor(level) if encoding == 'gzip' else BrotliCompressor(level)
+    if not stream:
+        return compressor.compress(body, flush=False) + compressor.finish()
+    out = [compressor.compress(body[i:i + CHUNK_SIZE]) for i in range(0, len(body), CHUNK_SIZE)]
+    out.append(compressor.finish())
+    return b''.join(out)
+
+
+def level_list(encoding):
+    low, high = LEVEL_RANGES[encoding]
+
+    def parse(value):
+        try:
+            levels = [int(level) for level in value.split(',')]
+        except ValueError:
+            raise argparse.ArgumentTypeError('levels must be comma separated integers')
+        for level in levels:
+            if not low <= level <= high:
+                raise argparse.ArgumentTypeError('%s levels must be between %d and %d' % (encoding, low, high))
+        return levels
+
+    return parse
+
+
+def measure(encoding, level, body, stream, repeat):
+    start = time.process_time()
+    for _ in range(repeat):
+        size = len(compress(encoding, level, body, stream))
+    return size, (time.process_time() - start) * 1000 / repeat
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark response compression per route.')
+    parser.add_argument('routes', nargs='*', help='extra GET paths to benchmark')
+    parser.add_argument('--repeat', type=int, default=20, help='compressions per measurement')
+    parser.add_argument('--gzip-levels', type=level_list('gzip'), default=LEVELS['gzip'],
+                        help='comma separated gzip levels to try, 1-9')
+    parser.add_argument('--br-levels', type=level_list('br'), default=LEVELS['br'],
+                        help='comma separated brotli levels to try, 0-11')
+    args = parser.parse_args(argv)
+
+    from app import app
+    app.config['WTF_CSRF_ENABLED'] = False
+    app.config['ACCESS_LOG'] = None
+    # a broken route is reported and skipped rather than ending the run
+    app.config['PROPAGATE_EXCEPTIONS'] = False
+    client = app.test_client()
+    levels = {'gzip': args.gzip_levels, 'br': args.br_levels}
+
+    out = sys.stdout
+    out.write('%-42s %-6s %5s %6s %10s %10s %7s %9s\n' % (
+        'route', 'enc', 'level', 'mode', 'bytes', 'saved', 'saved%', 'cpu ms'))
+    for method, path in DEFAULT_ROUTES + [('GET', route) for route in args.routes]:
+        status, body = fetch(client, method, path)
+        name = (method + ' ' + path)[:42]
+        if status != 200:
+            out.write('%-42s skipped, status %d\n' % (name, status))
+            continue
+        out.write('%-42s %-6s %5s %6s %10d\n' % (name, 'none', '-', '-', len(body)))
+        for encoding in available_encodings()[::-1]:
+            for level in levels[encoding]:
+                for stream in (False, True):
+                    size, cpu = measure(encoding, level, body, stream, args.repeat)
+                    out.write('%-42s %-6s %5d %6s %10d %10d %6.1f%% %9.3f\n' % (
+                        '', encoding, level, 'stream' if stream else 'buffer', size, len(body) - size,
+                        100.0 * (len(body) - size) / len(body) if body else 0, cpu))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+import zlib
+
+from flask import current_app, request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# ----------------------------------------------------------------------------#
+# Response compression.
+#
+# Negotiates br (when the brotli package is installed) or gzip from
+# Accept-Encoding. Buffered bodies are compressed in one go and keep an exact
+# Content-Length; streamed bodies and static files are compressed chunk by
+# chunk as they are sent, with a flush after every chunk of a streamed body.
+# Small bodies and types that are already compressed (images, fonts,
+# archives) are left alone.
+# ----------------------------------------------------------------------------#
+
+COMPRESS_MIMETYPES = [
+    'text/html', 'text/css', 'text/plain', 'text/xml', 'text/javascript',
+    'application/javascript', 'application/json', 'application/xml', 'image/svg+xml',
+]
+
+
+class GzipCompressor(object):
+    def __init__(self, level=6):
+        self._z = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data, flush=True):
+        # a sync flush lets the client decode every chunk as soon as it arrives
+        return self._z.compress(data) + (self._z.flush(zlib.Z_SYNC_FLUSH) if flush else b'')
+
+    def finish(self):
+        return self._z.flush()
+
+
+class BrotliCompressor(object):
+    def __init__(self, level=4):
+        self._c = brotli.Compressor(quality=level)
+
+    def compress(self, data, flush=True):
+        return self._c.process(data) + (self._c.flush() if flush else b'')
+
+    def finish(self):
+        return self._c.finish()
+
+
+def available_encodings():
+    return ['br', 'gzip'] if brotli is not None else ['gzip']
+
+
+def make_compressor(encoding, config):
+    if encoding == 'br':
+        return BrotliCompressor(config['COMPRESS_BR_LEVEL'])
+    return GzipCompressor(config['COMPRESS_LEVEL'])
+
+
+def compress_stream(chunks, compressor, flush=True, close=None):
+    try:
+        for chunk in chunks:
+            data = compressor.compress(chunk, flush=flush)
+            if data:
+                yield data
+        yield compressor.finish()
+    finally:
+        if close is not None:
+            close()
+
+
+class Compress(object):
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('COMPRESS_LEVEL', 6)
+        app.config.setdefault('COMPRESS_BR_LEVEL', 4)
+        app.config.setdefault('COMPRESS_MIN_SIZE', 500)
+        app.config.setdefault('COMPRESS_MIMETYPES', COMPRESS_MIMETYPES)
+        app.after_request(self._compress)
+
+    @staticmethod
+    def _compress(response):
+        config = current_app.config
+        # every answer for a compressible type varies by encoding, 304s and errors included
+        if response.mimetype in config['COMPRESS_MIMETYPES']:
+            response.vary.add('Accept-Encoding')
+        if response.status_code == 304:
+            # repeat the validator of the compressed 200 the client revalidates; static file 304s
+            # carry no Content-Type, so the weak tag the client sent is what identifies them
+            etag, weak = response.get_etag()
+            if etag and not weak and request.if_none_match.is_weak(etag):
+                response.set_etag(etag, weak=True)
+                response.vary.add('Accept-Encoding')
+                response.headers.pop('Accept-Ranges', None)
+            return response
+        if (response.mimetype not in config['COMPRESS_MIMETYPES'] or response.status_code != 200
+                or 'Content-Encoding' in response.headers or request.method == 'HEAD'):
+            return response
+        encoding = request.accept_encodings.best_match(available_encodings())
+        if encoding is None:
+            return response
+        if response.content_length is not None and response.content_length < config['COMPRESS_MIN_SIZE']:
+            return response
+
+        compressor = make_compressor(encoding, config)
+        if response.is_sequence:
+            body = response.get_data()
+            if len(body) < config['COMPRESS_MIN_SIZE']:
+                return response
+            response.set_data(compressor.compress(body, flush=False) + compressor.finish())
+        else:
+            # streamed bodies and send_file responses, never buffered as a whole; only generators
+            # are flushed per chunk, a file is read straight through and flushing would cost ratio
+            original = response.response
+            response.response = compress_stream(response.iter_encoded(), compressor,
+                                                flush=not response.direct_passthrough,
+                                                close=getattr(original, 'close', None))
+            response.direct_passthrough = False
+            response.headers.pop('Content-Length', None)
+        response.headers['Content-Encoding'] = encoding
+        # the compressed bytes differ from the identity ones, and byte ranges no longer line up with the file
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        response.headers.pop('Accept-Ranges', None)
+        return response
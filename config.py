@@ -6,6 +6,21 @@ basedir = os.path.abspath(os.path.dirname(__file__))
 # Enable debug mode.
 DEBUG = True
 
+# Structured access log, one JSON line per request (see accesslog.py).
+# Set to None to disable.
+ACCESS_LOG = os.path.join(basedir, 'access.jsonl')
+
+# Shows that started more than this many days ago are moved to ShowArchive
+# by `flask fyyur archive`; detail pages load them on demand, this many at a time.
+SHOW_ARCHIVE_HORIZON_DAYS = 365
+SHOW_ARCHIVE_PAGE_SIZE = 12
+
+# Response compression (see compression.py). Levels are gzip 1-9 and brotli 0-11,
+# bodies smaller than COMPRESS_MIN_SIZE bytes are sent as is.
+COMPRESS_LEVEL = 6
+COMPRESS_BR_LEVEL = 4
+COMPRESS_MIN_SIZE = 500
+
 # Connect to the database
 
 
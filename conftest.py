@@ -0,0 +1,32 @@
+from datetime import datetime
+
+import pytest
+
+import config
+
+# run the suite against an in-memory SQLite database instead of the configured Postgres one
+config.SQLALCHEMY_DATABASE_URI = 'sqlite://'
+config.ACCESS_LOG = None
+
+from app import app as fyyur_app, db, Venue, Artist, Show  # noqa: E402
+
+
+@pytest.fixture
+def app():
+    fyyur_app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    with fyyur_app.app_context():
+        db.create_all()
+        venue = Venue(name='The Musical Hop', genres='Jazz,Reggae', city='San Francisco', state='CA')
+        artist = Artist(name='Guns N Petals', genres='Rock n Roll', city='San Francisco', state='CA')
+        db.session.add_all([venue, artist])
+        db.session.commit()
+        db.session.add(Show(venue_id=venue.id, artist_id=artist.id, start_time=datetime(2035, 4, 1, 20)))
+        db.session.commit()
+        yield fyyur_app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -0,0 +1,165 @@
+"""Replay an access log (see accesslog.py) against Fyyur and report latency per endpoint.
+
+    python replay.py access.jsonl                       # Flask test client, original pacing
+    python replay.py access.jsonl --speed 4 --workers 16
+    python replay.py access.jsonl --speed 0 --url http://localhost:5000
+
+--speed scales the original inter-arrival times (2 = twice as fast, 0 = as fast
+as possible). When paced, latencies are measured from the time each request was
+due, so time spent waiting for a free worker is included; "wait" reports that
+part alone. Only reads are replayed by default: GET/HEAD requests and the
+search POSTs. Pass --writes to also replay form submissions and deletes.
+"""
+import argparse
+import json
+import math
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+
+def load_records(path, writes=False):
+    records = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if writes or is_read(record):
+                records.append(record)
+    records.sort(key=lambda r: r['ts'])
+    return records
+
+
+def is_read(record):
+    if record['method'] in ('GET', 'HEAD'):
+        return True
+    return record['method'] == 'POST' and (record.get('route') or '').endswith('/search')
+
+
+def form_data(record):
+    # field name -> list of submitted values
+    return record.get('form') or {}
+
+
+class TestClientTarget(object):
+    def __init__(self):
+        from app import app
+        app.config['WTF_CSRF_ENABLED'] = False
+        # don't append the replayed traffic to the log being replayed
+        app.config['ACCESS_LOG'] = None
+        self.app = app
+        self.local = threading.local()
+
+    def send(self, record):
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            client = self.local.client = self.app.test_client()
+        data = form_data(record) if record['method'] == 'POST' else None
+        response = client.open(record['path'], method=record['method'], data=data)
+        response.close()
+        return response.status_code
+
+
+class HttpTarget(object):
+    def __init__(self, url):
+        self.url = url.rstrip('/')
+
+    def send(self, record):
+        data = None
+        if record['method'] == 'POST':
+            data = urllib.parse.urlencode(form_data(record), doseq=True).encode('utf-8')
+        req = urllib.request.Request(self.url + record['path'], data=data, method=record['method'])
+        try:
+            with urllib.request.urlopen(req) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+
+def percentile(values, pct):
+    # nearest-rank on an already sorted list
+    if not values:
+        return 0.0
+    k = int(math.ceil(pct / 100.0 * len(values))) - 1
+    return values[max(0, min(len(values) - 1, k))]
+
+
+def replay(records, target, speed=1.0, workers=8):
+    # with a schedule (speed > 0) latency is measured from the time a request was due, so waiting
+    # for a free worker counts; the wait alone is kept to tell a slow app from too few workers
+    results = defaultdict(list)
+    waits = defaultdict(list)
+    errors = defaultdict(int)
+    lock = threading.Lock()
+
+    def run(record, due):
+        endpoint = record['method'] + ' ' + (record.get('route') or record['path'])
+        start = time.perf_counter()
+        if due is None:
+            due = start
+        try:
+            status = target.send(record)
+        except Exception:
+            status = None
+        end = time.perf_counter()
+        with lock:
+            results[endpoint].append((end - due) * 1000)
+            waits[endpoint].append(max(0.0, start - due) * 1000)
+            if status is None or status >= 500:
+                errors[endpoint] += 1
+
+    if not records:
+        return results, waits, errors, 0.0
+    t0 = records[0]['ts']
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for record in records:
+            due = None
+            if speed:
+                due = started + (record['ts'] - t0) / speed
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            pool.submit(run, record, due)
+    return results, waits, errors, time.perf_counter() - started
+
+
+def report(results, waits, errors, duration, out=sys.stdout):
+    total = sum(len(v) for v in results.values())
+    out.write('%d requests in %.2fs (%.1f req/s)\n\n' % (total, duration, total / duration if duration else 0))
+    out.write('%-40s %7s %7s %9s %9s %9s %9s %11s\n' % (
+        'endpoint', 'count', 'errors', 'p50 ms', 'p90 ms', 'p99 ms', 'max ms', 'p99 wait ms'))
+    for endpoint in sorted(results, key=lambda e: -len(results[e])):
+        values = sorted(results[endpoint])
+        out.write('%-40s %7d %7d %9.2f %9.2f %9.2f %9.2f %11.2f\n' % (
+            endpoint[:40], len(values), errors[endpoint],
+            percentile(values, 50), percentile(values, 90), percentile(values, 99), values[-1],
+            percentile(sorted(waits[endpoint]), 99)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Replay a Fyyur access log and report latency percentiles.')
+    parser.add_argument('log', help='JSONL access log written by accesslog.py')
+    parser.add_argument('--url', help='replay over HTTP against this server instead of the Flask test client')
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help='rate multiplier for the original pacing, 0 replays as fast as possible')
+    parser.add_argument('--workers', type=int, default=8, help='number of concurrent workers')
+    parser.add_argument('--writes', action='store_true', help='also replay form submissions and deletes')
+    args = parser.parse_args(argv)
+
+    records = load_records(args.log, writes=args.writes)
+    target = HttpTarget(args.url) if args.url else TestClientTarget()
+    results, waits, errors, duration = replay(records, target, speed=args.speed, workers=args.workers)
+    report(results, waits, errors, duration)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+import io
+import json
+
+from sqlalchemy import event
+
+import replay
+from app import db, access_log
+
+
+def read_log(path):
+    access_log.writer.close()
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+
+def test_request_writes_one_record(app, client, tmp_path, monkeypatch):
+    path = str(tmp_path / 'access.jsonl')
+    monkeypatch.setitem(app.config, 'ACCESS_LOG', path)
+    executed = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', count)
+    try:
+        assert client.get('/venues/1?tab=shows').status_code == 200
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', count)
+
+    [record] = read_log(path)
+    assert record['method'] == 'GET'
+    assert record['path'] == '/venues/1?tab=shows'
+    assert record['route'] == '/venues/<int:venue_id>'
+    assert record['params'] == {'venue_id': 1, 'tab': 'shows'}
+    assert record['status'] == 200
+    assert record['queries'] == len(executed) > 0
+    assert record['bytes'] > 0
+
+
+def test_form_fields_keep_every_value(app, client, tmp_path, monkeypatch):
+    path = str(tmp_path / 'access.jsonl')
+    monkeypatch.setitem(app.config, 'ACCESS_LOG', path)
+    client.post('/venues/search', data={'search_term': 'hop', 'genres': ['Jazz', 'Folk'], 'csrf_token': 'x'})
+
+    [record] = read_log(path)
+    assert record['params'] == {}
+    assert record['form'] == {'search_term': ['hop'], 'genres': ['Jazz', 'Folk']}
+
+
+def test_replay_reports_every_endpoint(app):
+    records = [
+        {'ts': 0.0, 'method': 'GET', 'path': '/venues', 'route': '/venues', 'form': {}},
+        {'ts': 0.1, 'method': 'GET', 'path': '/artists/1', 'route': '/artists/<int:artist_id>', 'form': {}},
+        {'ts': 0.2, 'method': 'GET', 'path': '/artists/1', 'route': '/artists/<int:artist_id>', 'form': {}},
+        {'ts': 0.3, 'method': 'POST', 'path': '/venues/search', 'route': '/venues/search',
+         'form': {'search_term': ['hop']}},
+    ]
+    results, waits, errors, duration = replay.replay(records, replay.TestClientTarget(), speed=0, workers=2)
+
+    assert {endpoint: len(values) for endpoint, values in results.items()} == {
+        'GET /venues': 1, 'GET /artists/<int:artist_id>': 2, 'POST /venues/search': 1}
+    assert not any(errors.values())
+    out = io.StringIO()
+    replay.report(results, waits, errors, duration, out=out)
+    lines = out.getvalue().splitlines()
+    assert lines[0].startswith('4 requests in ')
+    assert lines[3].split()[:4] == ['GET', '/artists/<int:artist_id>', '2', '0']
+
+
+def test_percentile_is_nearest_rank():
+    values = list(range(1, 101))
+    assert replay.percentile(values, 50) == 50
+    assert replay.percentile(values, 99) == 99
+    assert replay.percentile([7], 90) == 7
+    assert replay.percentile([], 50) == 0.0
+
+
+def test_bytes_are_counted_as_sent(app, client, tmp_path, monkeypatch):
+    path = str(tmp_path / 'access.jsonl')
+    monkeypatch.setitem(app.config, 'ACCESS_LOG', path)
+    sizes = []
+    for url, encoding in [('/static/js/libs/jquery-1.11.1.min.js', 'identity'),
+                          ('/static/js/libs/jquery-1.11.1.min.js', 'gzip'),
+                          ('/venues', 'gzip')]:
+        response = client.get(url, headers={'Accept-Encoding': encoding})
+        sizes.append(len(response.get_data()))
+        response.close()
+
+    records = read_log(path)
+    assert [record['bytes'] for record in records] == sizes
+    assert sizes[1] < sizes[0]
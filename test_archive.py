@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta
+
+from app import db, Show, ShowArchive, archive_shows
+
+
+def test_archive_moves_old_shows(app):
+    db.session.add(Show(venue_id=1, artist_id=1, start_time=datetime(2015, 6, 1, 21)))
+    db.session.commit()
+    assert archive_shows(datetime.utcnow() - timedelta(days=365)) == 1
+    assert Show.query.count() == 1
+    assert ShowArchive.query.count() == 1
+
+
+def test_load_more_pages_through_archive(app, client):
+    app.config['SHOW_ARCHIVE_PAGE_SIZE'] = 2
+    for day in (1, 2, 3):
+        db.session.add(Show(venue_id=1, artist_id=1, start_time=datetime(2015, 6, day, 21)))
+    db.session.commit()
+    archive_shows(datetime(2016, 1, 1))
+
+    page = client.get('/venues/1/past_shows').get_json()
+    assert [show['start_time'] for show in page['shows']] == ['Wednesday June, 3, 2015 at 9:00PM',
+                                                              'Tuesday June, 2, 2015 at 9:00PM']
+    page = client.get(page['next']).get_json()
+    assert [show['start_time'] for show in page['shows']] == ['Monday June, 1, 2015 at 9:00PM']
+    assert page['next'] is None
+
+
+def test_load_more_rejects_bad_cursor(client):
+    assert client.get('/venues/1/past_shows?before=garbage').status_code == 400
+    assert client.get('/artists/1/past_shows?before=2015-06-01T21:00:00&before_id=x').status_code == 400
+
+
+def test_artist_load_more_pages_through_archive(app, client):
+    app.config['SHOW_ARCHIVE_PAGE_SIZE'] = 2
+    for day in (1, 2, 3):
+        db.session.add(Show(venue_id=1, artist_id=1, start_time=datetime(2015, 6, day, 21)))
+    db.session.commit()
+    archive_shows(datetime(2016, 1, 1))
+
+    page = client.get('/artists/1/past_shows').get_json()
+    assert [show['venue_name'] for show in page['shows']] == ['The Musical Hop', 'The Musical Hop']
+    assert [show['start_time'] for show in page['shows']] == ['Wednesday June, 3, 2015 at 9:00PM',
+                                                              'Tuesday June, 2, 2015 at 9:00PM']
+    page = client.get(page['next']).get_json()
+    assert [show['start_time'] for show in page['shows']] == ['Monday June, 1, 2015 at 9:00PM']
+    assert page['next'] is None
+
+
+def test_detail_pages_offer_archived_shows(app, client):
+    assert b'Load older shows' not in client.get('/venues/1').data
+    assert b'Load older shows' not in client.get('/artists/1').data
+
+    db.session.add(Show(venue_id=1, artist_id=1, start_time=datetime(2015, 6, 1, 21)))
+    db.session.commit()
+    archive_shows(datetime(2016, 1, 1))
+
+    assert b'Load older shows' in client.get('/venues/1').data
+    assert b'Load older shows' in client.get('/artists/1').data
+
+
+def test_hot_past_shows_match_archived_tiles(app, client):
+    db.session.add(Show(venue_id=1, artist_id=1, start_time=datetime(2020, 6, 1, 21)))
+    db.session.commit()
+    for path in ('/venues/1', '/artists/1'):
+        response = client.get(path)
+        assert response.status_code == 200
+        assert b'Monday June, 1, 2020 at 9:00PM' in response.data
@@ -0,0 +1,112 @@
+import gzip
+
+import pytest
+from flask import Flask, Response
+
+from compression import Compress, GzipCompressor
+
+PAGE = '<html>' + '<p>The Musical Hop</p>' * 200 + '</html>'
+
+
+@pytest.fixture
+def compressed():
+    app = Flask(__name__)
+    Compress(app)
+
+    @app.route('/page')
+    def page():
+        response = Response(PAGE, mimetype='text/html')
+        response.set_etag('page')
+        return response
+
+    @app.route('/small')
+    def small():
+        return Response('<p>hi</p>', mimetype='text/html')
+
+    @app.route('/stream')
+    def stream():
+        return Response((line for line in PAGE.split('</p>')), mimetype='text/html')
+
+    @app.route('/image')
+    def image():
+        return Response(b'\x89PNG' * 500, mimetype='image/png')
+
+    @app.route('/missing')
+    def missing():
+        return Response(PAGE, status=404, mimetype='text/html')
+
+    return app.test_client()
+
+
+def test_gzip_round_trip(compressed):
+    response = compressed.get('/page', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert int(response.headers['Content-Length']) == len(response.data) < len(PAGE)
+    assert gzip.decompress(response.data).decode('utf-8') == PAGE
+
+
+def test_brotli_round_trip(compressed):
+    brotli = pytest.importorskip('brotli')
+    response = compressed.get('/page', headers={'Accept-Encoding': 'gzip, br'})
+    assert response.headers['Content-Encoding'] == 'br'
+    assert brotli.decompress(response.data).decode('utf-8') == PAGE
+
+
+def test_generator_body_is_streamed(compressed):
+    response = compressed.get('/stream', headers={'Accept-Encoding': 'gzip'}, buffered=False)
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Content-Length' not in response.headers
+    chunks = list(response.response)
+    response.close()
+    # one flushed chunk per generator item, plus the gzip trailer
+    assert len(chunks) == len(PAGE.split('</p>')) + 1
+    assert gzip.decompress(b''.join(chunks)).decode('utf-8') == PAGE.replace('</p>', '')
+
+
+def test_static_file_is_compressed_without_flushes(client):
+    identity = client.get('/static/css/bootstrap.css')
+    body = identity.get_data()
+    identity.close()
+    response = client.get('/static/css/bootstrap.css', headers={'Accept-Encoding': 'gzip'})
+    data = response.get_data()
+    response.close()
+    assert 'Accept-Ranges' not in response.headers
+    assert gzip.decompress(data) == body
+    # no per-chunk flushes: the same bytes as compressing the whole file in one go
+    compressor = GzipCompressor(6)
+    assert data == compressor.compress(body, flush=False) + compressor.finish()
+
+
+@pytest.mark.parametrize('path', ['/small', '/image'])
+def test_small_and_binary_bodies_are_left_alone(compressed, path):
+    response = compressed.get(path, headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
+
+
+def test_head_and_errors_are_left_alone(compressed):
+    response = compressed.head('/page', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
+    response = compressed.get('/missing', headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 404
+    assert 'Content-Encoding' not in response.headers
+    assert response.data.decode('utf-8') == PAGE
+
+
+def test_etag_weakens_and_vary_is_set(compressed):
+    response = compressed.get('/page', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['ETag'] == 'W/"page"'
+    assert 'Accept-Encoding' in response.vary
+    response = compressed.get('/page', headers={'Accept-Encoding': 'identity'})
+    assert response.headers['ETag'] == '"page"'
+    assert 'Accept-Encoding' in response.vary
+
+
+def test_static_304_repeats_the_weak_validator(client):
+    response = client.get('/static/css/bootstrap.css', headers={'Accept-Encoding': 'gzip'})
+    etag = response.headers['ETag']
+    response.close()
+    assert etag.startswith('W/')
+    response = client.get('/static/css/bootstrap.css', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.headers['ETag'] == etag
+    assert 'Accept-Encoding' in response.vary
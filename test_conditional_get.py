@@ -0,0 +1,63 @@
+import pytest
+from sqlalchemy import event
+
+from app import db, Venue, Artist, Show
+
+
+def rename_venue():
+    Venue.query.first().name = 'The Dueling Pianos Bar'
+    db.session.commit()
+
+
+def rename_artist():
+    Artist.query.first().name = 'Matt Quevedo'
+    db.session.commit()
+
+
+def delete_show():
+    Show.query.delete()
+    db.session.commit()
+
+
+@pytest.fixture
+def statements(app):
+    executed = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', count)
+    yield executed
+    event.remove(db.engine, 'before_cursor_execute', count)
+
+
+@pytest.mark.parametrize('path, change', [
+    ('/venues', rename_venue),
+    ('/venues/1', delete_show),
+    ('/artists', rename_artist),
+    ('/artists/1', delete_show),
+    ('/shows', delete_show),
+])
+def test_conditional_get(client, statements, path, change):
+    response = client.get(path)
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+
+    del statements[:]
+    response = client.get(path, headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+    assert len(statements) == 1
+
+    change()
+    response = client.get(path, headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+
+def test_if_modified_since_alone_is_not_trusted(client):
+    response = client.get('/artists/1')
+    assert 'Last-Modified' not in response.headers
+    delete_show()
+    response = client.get('/artists/1', headers={'If-Modified-Since': 'Tue, 01 Jan 2036 00:00:00 GMT'})
+    assert response.status_code == 200